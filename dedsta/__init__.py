@@ -0,0 +1,25 @@
+__author__ = "Tomasz Rybotycki"
+
+from dedsta.algorithm import DEDSTA
+from dedsta.nonstationarity import (
+    KPSSNonstationarityDegreeEstimator,
+    NonstationarityDegreeEstimator,
+)
+from dedsta.structure import (
+    DEDSTAAgingModule,
+    DEDSTAModule,
+    DEDSTAReductionModule,
+    DEDSTAReservoir,
+    DEDSTASlidingWindowReservoir,
+)
+
+__all__ = [
+    "DEDSTA",
+    "DEDSTAAgingModule",
+    "DEDSTAModule",
+    "DEDSTAReductionModule",
+    "DEDSTAReservoir",
+    "DEDSTASlidingWindowReservoir",
+    "KPSSNonstationarityDegreeEstimator",
+    "NonstationarityDegreeEstimator",
+]
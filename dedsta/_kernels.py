@@ -0,0 +1,548 @@
+"""
+Small numerical kernels called once per update or evaluation on the hot path of
+the stream processing. If numba is available, they are JIT-compiled into single
+fused loops, which removes the NumPy dispatch overhead dominating for such small
+workloads. Otherwise, equivalent NumPy implementations are used.
+"""
+
+__author__ = "Tomasz Rybotycki"
+
+from numpy import arange, bincount, float32, float64, intp, multiply, zeros
+from numpy.typing import NDArray
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE: bool = True
+except ImportError:
+    NUMBA_AVAILABLE: bool = False
+
+
+if NUMBA_AVAILABLE:
+
+    @njit(cache=True, fastmath=True)
+    def aging_weights(weights: NDArray[float32], nonstationarity: float) -> None:
+        """
+        Computes the weights of the aging module in place. The weight of the i-th
+        newest data point is :math:`2 (1 - i \\nu / n)`.
+
+        :param weights:
+            Weights of the data points from the newest to the oldest one. They are
+            overwritten.
+        :param nonstationarity:
+            Nonstationarity degree.
+        """
+        n = weights.shape[0]
+        step = 2.0 * nonstationarity / n
+
+        for i in range(n):
+            weights[i] = 2.0 - i * step
+
+    @njit(cache=True, fastmath=True)
+    def aged_linear_binning(
+        points: NDArray[float64],
+        weights: NDArray[float32],
+        nonstationarity: float,
+        grid_start: float,
+        dx: float,
+        n_grid_points: int,
+    ) -> NDArray[float64]:
+        """
+        Computes the aging weights of the data points and linearly bins the points
+        with these weights onto an equidistant grid, in a single pass over the data.
+        The weights are the same as the ones computed by aging_weights, and they
+        are written to the given array as well.
+
+        :param points:
+            Data points from the newest to the oldest one, as an array of shape
+            (n,). They have to lie strictly inside the grid.
+        :param weights:
+            Array of shape (n,) to which the weights of the data points are
+            written.
+        :param nonstationarity:
+            Nonstationarity degree.
+        :param grid_start:
+            The first grid point.
+        :param dx:
+            Distance between the neighbouring grid points.
+        :param n_grid_points:
+            Number of grid points.
+
+        :return:
+            Binned weights normalized to sum to one, as an array of shape
+            (n_grid_points,).
+        """
+        n = points.shape[0]
+        step = 2.0 * nonstationarity / n
+        # One extra bin for the data points which are rounded to the last grid
+        # point.
+        bins = zeros(n_grid_points + 1)
+        total = 0.0
+
+        for i in range(n):
+            weight = 2.0 - i * step
+            weights[i] = weight
+            t = (points[i] - grid_start) / dx
+            j = int(t)
+            right_weight = (t - j) * weight
+            bins[j] += weight - right_weight
+            bins[j + 1] += right_weight
+            total += weight
+
+        return bins[:n_grid_points] / total
+
+    @njit(cache=True)
+    def update_kpss_partial_sums(
+        x: NDArray[float64],
+        oldest: NDArray[float64],
+        filled: int,
+        window_size: int,
+        sums: NDArray[float64],
+        squares_sums: NDArray[float64],
+        cumulative_sums: NDArray[float64],
+        cumulative_squares_sums: NDArray[float64],
+        weighted_cumulative_sums: NDArray[float64],
+    ) -> None:
+        """
+        Updates the partial sums of the incremental KPSS statistic in place with a
+        new data point. If the window is full, the oldest data point is removed
+        from the sums.
+
+        :param x:
+            New data point.
+        :param oldest:
+            The oldest data point in the window. It's ignored if the window isn't
+            full.
+        :param filled:
+            Number of data points in the window before the update.
+        :param window_size:
+            Size of the window.
+        :param sums:
+            Sums of the data points.
+        :param squares_sums:
+            Sums of the squares of the data points.
+        :param cumulative_sums:
+            Sums of the cumulative sums of the data points.
+        :param cumulative_squares_sums:
+            Sums of the squares of the cumulative sums of the data points.
+        :param weighted_cumulative_sums:
+            Sums of the cumulative sums of the data points weighted by their
+            indices.
+        """
+        n = window_size
+
+        for j in range(x.shape[0]):
+            # Cumulative sum ending at the new data point.
+            c = sums[j] + x[j]
+
+            if filled < window_size:
+                cumulative_sums[j] += c
+                cumulative_squares_sums[j] += c * c
+                weighted_cumulative_sums[j] += (filled + 1) * c
+                sums[j] += x[j]
+                squares_sums[j] += x[j] * x[j]
+                continue
+
+            o = oldest[j]
+            shifted = cumulative_sums[j] - o + c
+
+            cumulative_squares_sums[j] += (
+                c * c - o * o - 2.0 * o * shifted + n * o * o
+            )
+            weighted_cumulative_sums[j] += (
+                (n + 1) * c - o - shifted - o * n * (n + 1) / 2.0
+            )
+            cumulative_sums[j] = shifted - n * o
+            sums[j] += x[j] - o
+            squares_sums[j] += x[j] * x[j] - o * o
+
+    @njit(cache=True)
+    def update_kpss_lagged_products(
+        x: NDArray[float64],
+        data: NDArray[float64],
+        shift: NDArray[float64],
+        head: int,
+        filled: int,
+        lagged_products: NDArray[float64],
+    ) -> None:
+        """
+        Updates the sums of the products of the data points and their lagged values,
+        :math:`\\sum_t x_t x_{t - i}`, in place with a new data point. If the window
+        is full, the oldest data point is removed from the sums.
+
+        :param x:
+            New data point, shifted by shift.
+        :param data:
+            Ring buffer with the (not shifted) data points from the window.
+        :param shift:
+            Value by which the data points are shifted.
+        :param head:
+            Index of the ring buffer at which the new data point will be written.
+        :param filled:
+            Number of data points in the window before the update.
+        :param lagged_products:
+            Array of shape (nlags, d) with the sums for the lags 1, ..., nlags. The
+            number of lags has to be smaller than the window size.
+        """
+        window_size = data.shape[0]
+
+        for j in range(x.shape[0]):
+            if filled == window_size:
+                oldest = data[head, j] - shift[j]
+
+                for i in range(1, lagged_products.shape[0] + 1):
+                    lagged_products[i - 1, j] -= oldest * (
+                        data[(head + i) % window_size, j] - shift[j]
+                    )
+
+            for i in range(1, min(lagged_products.shape[0], filled) + 1):
+                lagged_products[i - 1, j] += x[j] * (
+                    data[(head - i) % window_size, j] - shift[j]
+                )
+
+    @njit(cache=True)
+    def update_kpss_batch(
+        data_points: NDArray[float64],
+        data: NDArray[float64],
+        shift: NDArray[float64],
+        head: int,
+        filled: int,
+        sums: NDArray[float64],
+        squares_sums: NDArray[float64],
+        cumulative_sums: NDArray[float64],
+        cumulative_squares_sums: NDArray[float64],
+        weighted_cumulative_sums: NDArray[float64],
+        lagged_products: NDArray[float64],
+    ) -> None:
+        """
+        Writes a batch of data points into the ring buffer of the window and
+        updates the partial sums of the incremental KPSS statistic with them, one
+        data point after another. The data points removed from the window are read
+        from the buffer before they are overwritten.
+
+        :param data_points:
+            New data points, in the order of their arrival, as an array of shape
+            (k, d). The batch has to be smaller than the window.
+        :param data:
+            Ring buffer with the (not shifted) data points from the window. It's
+            overwritten.
+        :param shift:
+            Value by which the data points are shifted in the sums.
+        :param head:
+            Index of the ring buffer at which the first new data point will be
+            written.
+        :param filled:
+            Number of data points in the window before the update.
+        :param sums:
+            Sums of the data points.
+        :param squares_sums:
+            Sums of the squares of the data points.
+        :param cumulative_sums:
+            Sums of the cumulative sums of the data points.
+        :param cumulative_squares_sums:
+            Sums of the squares of the cumulative sums of the data points.
+        :param weighted_cumulative_sums:
+            Sums of the cumulative sums of the data points weighted by their
+            indices.
+        :param lagged_products:
+            Array of shape (nlags, d) with the sums of the products of the data
+            points and their lagged values, for the lags 1, ..., nlags.
+        """
+        window_size = data.shape[0]
+
+        for i in range(data_points.shape[0]):
+            x = data_points[i] - shift
+
+            if filled < window_size:
+                oldest = x
+            else:
+                oldest = data[head] - shift
+
+            update_kpss_partial_sums(
+                x, oldest, filled, window_size, sums, squares_sums,
+                cumulative_sums, cumulative_squares_sums, weighted_cumulative_sums
+            )
+
+            if lagged_products.shape[0] > 0:
+                update_kpss_lagged_products(
+                    x, data, shift, head, filled, lagged_products
+                )
+
+            data[head] = data_points[i]
+            head = (head + 1) % window_size
+            filled = min(filled + 1, window_size)
+
+else:
+
+    # Ages of the data points, grown on demand and sliced in every call.
+    _indices: NDArray[float64] = arange(0, dtype=float64)
+
+    def aging_weights(weights: NDArray[float32], nonstationarity: float) -> None:
+        """
+        Computes the weights of the aging module in place. The weight of the i-th
+        newest data point is :math:`2 (1 - i \\nu / n)`.
+
+        :param weights:
+            Weights of the data points from the newest to the oldest one. They are
+            overwritten.
+        :param nonstationarity:
+            Nonstationarity degree.
+        """
+        global _indices
+        n: int = weights.shape[0]
+
+        if len(_indices) < n:
+            _indices = arange(n, dtype=float64)
+
+        multiply(_indices[:n], -2 * nonstationarity / n, out=weights)
+        weights += 2
+
+    def aged_linear_binning(
+        points: NDArray[float64],
+        weights: NDArray[float32],
+        nonstationarity: float,
+        grid_start: float,
+        dx: float,
+        n_grid_points: int,
+    ) -> NDArray[float64]:
+        """
+        Computes the aging weights of the data points and linearly bins the points
+        with these weights onto an equidistant grid. The weights are the same as
+        the ones computed by aging_weights, and they are written to the given array
+        as well.
+
+        :param points:
+            Data points from the newest to the oldest one, as an array of shape
+            (n,). They have to lie strictly inside the grid.
+        :param weights:
+            Array of shape (n,) to which the weights of the data points are
+            written.
+        :param nonstationarity:
+            Nonstationarity degree.
+        :param grid_start:
+            The first grid point.
+        :param dx:
+            Distance between the neighbouring grid points.
+        :param n_grid_points:
+            Number of grid points.
+
+        :return:
+            Binned weights normalized to sum to one, as an array of shape
+            (n_grid_points,).
+        """
+        n: int = len(points)
+        point_weights: NDArray[float64] = 2 - arange(n, dtype=float64) * (
+            2 * nonstationarity / n
+        )
+        weights[:] = point_weights
+
+        transformed_points: NDArray[float64] = (points - grid_start) / dx
+        indices: NDArray[intp] = transformed_points.astype(intp)
+        right_weights: NDArray[float64] = (
+            (transformed_points - indices) * point_weights
+        )
+
+        # One extra bin for the data points which are rounded to the last grid
+        # point.
+        bins: NDArray[float64] = (
+            bincount(
+                indices, point_weights - right_weights, minlength=n_grid_points + 1
+            )
+            + bincount(indices + 1, right_weights, minlength=n_grid_points + 1)
+        )
+
+        return bins[:n_grid_points] / point_weights.sum()
+
+    def update_kpss_partial_sums(
+        x: NDArray[float64],
+        oldest: NDArray[float64],
+        filled: int,
+        window_size: int,
+        sums: NDArray[float64],
+        squares_sums: NDArray[float64],
+        cumulative_sums: NDArray[float64],
+        cumulative_squares_sums: NDArray[float64],
+        weighted_cumulative_sums: NDArray[float64],
+    ) -> None:
+        """
+        Updates the partial sums of the incremental KPSS statistic in place with a
+        new data point. If the window is full, the oldest data point is removed
+        from the sums.
+
+        :param x:
+            New data point.
+        :param oldest:
+            The oldest data point in the window. It's ignored if the window isn't
+            full.
+        :param filled:
+            Number of data points in the window before the update.
+        :param window_size:
+            Size of the window.
+        :param sums:
+            Sums of the data points.
+        :param squares_sums:
+            Sums of the squares of the data points.
+        :param cumulative_sums:
+            Sums of the cumulative sums of the data points.
+        :param cumulative_squares_sums:
+            Sums of the squares of the cumulative sums of the data points.
+        :param weighted_cumulative_sums:
+            Sums of the cumulative sums of the data points weighted by their
+            indices.
+        """
+        # Cumulative sum ending at the new data point.
+        c: NDArray[float64] = sums + x
+
+        if filled < window_size:
+            cumulative_sums += c
+            cumulative_squares_sums += c * c
+            weighted_cumulative_sums += (filled + 1) * c
+            sums += x
+            squares_sums += x * x
+            return
+
+        n: int = window_size
+        # Sum of the cumulative sums without the first one, but with the new one.
+        shifted: NDArray[float64] = cumulative_sums - oldest + c
+
+        # After the oldest data point is removed, all the cumulative sums decrease
+        # by its value and their indices decrease by one.
+        cumulative_squares_sums += (
+            c * c - oldest * oldest - 2 * oldest * shifted + n * oldest * oldest
+        )
+        weighted_cumulative_sums += (
+            (n + 1) * c - oldest - shifted - oldest * n * (n + 1) / 2
+        )
+        cumulative_sums[:] = shifted - n * oldest
+        sums += x - oldest
+        squares_sums += x * x - oldest * oldest
+
+    def update_kpss_lagged_products(
+        x: NDArray[float64],
+        data: NDArray[float64],
+        shift: NDArray[float64],
+        head: int,
+        filled: int,
+        lagged_products: NDArray[float64],
+    ) -> None:
+        """
+        Updates the sums of the products of the data points and their lagged values,
+        :math:`\\sum_t x_t x_{t - i}`, in place with a new data point. If the window
+        is full, the oldest data point is removed from the sums.
+
+        :param x:
+            New data point, shifted by shift.
+        :param data:
+            Ring buffer with the (not shifted) data points from the window.
+        :param shift:
+            Value by which the data points are shifted.
+        :param head:
+            Index of the ring buffer at which the new data point will be written.
+        :param filled:
+            Number of data points in the window before the update.
+        :param lagged_products:
+            Array of shape (nlags, d) with the sums for the lags 1, ..., nlags. The
+            number of lags has to be smaller than the window size.
+        """
+        window_size: int = len(data)
+        nlags: int = len(lagged_products)
+
+        if filled == window_size:
+            lagged_products -= (data[head] - shift) * (
+                data[(head + arange(1, nlags + 1)) % window_size] - shift
+            )
+
+        m: int = min(nlags, filled)
+        lagged_products[:m] += x * (
+            data[(head - arange(1, m + 1)) % window_size] - shift
+        )
+
+    def update_kpss_batch(
+        data_points: NDArray[float64],
+        data: NDArray[float64],
+        shift: NDArray[float64],
+        head: int,
+        filled: int,
+        sums: NDArray[float64],
+        squares_sums: NDArray[float64],
+        cumulative_sums: NDArray[float64],
+        cumulative_squares_sums: NDArray[float64],
+        weighted_cumulative_sums: NDArray[float64],
+        lagged_products: NDArray[float64],
+    ) -> None:
+        """
+        Writes a batch of data points into the ring buffer of the window and
+        updates the partial sums of the incremental KPSS statistic with them, one
+        data point after another. The data points removed from the window are read
+        from the buffer before they are overwritten.
+
+        :param data_points:
+            New data points, in the order of their arrival, as an array of shape
+            (k, d). The batch has to be smaller than the window.
+        :param data:
+            Ring buffer with the (not shifted) data points from the window. It's
+            overwritten.
+        :param shift:
+            Value by which the data points are shifted in the sums.
+        :param head:
+            Index of the ring buffer at which the first new data point will be
+            written.
+        :param filled:
+            Number of data points in the window before the update.
+        :param sums:
+            Sums of the data points.
+        :param squares_sums:
+            Sums of the squares of the data points.
+        :param cumulative_sums:
+            Sums of the cumulative sums of the data points.
+        :param cumulative_squares_sums:
+            Sums of the squares of the cumulative sums of the data points.
+        :param weighted_cumulative_sums:
+            Sums of the cumulative sums of the data points weighted by their
+            indices.
+        :param lagged_products:
+            Array of shape (nlags, d) with the sums of the products of the data
+            points and their lagged values, for the lags 1, ..., nlags.
+        """
+        window_size: int = data.shape[0]
+
+        for i in range(data_points.shape[0]):
+            x: NDArray[float64] = data_points[i] - shift
+
+            if filled < window_size:
+                oldest: NDArray[float64] = x
+            else:
+                oldest = data[head] - shift
+
+            update_kpss_partial_sums(
+                x, oldest, filled, window_size, sums, squares_sums,
+                cumulative_sums, cumulative_squares_sums, weighted_cumulative_sums
+            )
+
+            if lagged_products.shape[0] > 0:
+                update_kpss_lagged_products(
+                    x, data, shift, head, filled, lagged_products
+                )
+
+            data[head] = data_points[i]
+            head = (head + 1) % window_size
+            filled = min(filled + 1, window_size)
+
+
+# Pay the compilation (or on-disk cache loading) cost once, at import.
+aging_weights(arange(2, dtype=float32), 0.5)
+aged_linear_binning(
+    arange(1, 3, dtype=float64), arange(2, dtype=float32), 0.5, 0.0, 1.0, 4
+)
+update_kpss_partial_sums(
+    *(arange(1, dtype=float64) for _ in range(2)), 0, 1,
+    *(arange(1, dtype=float64) for _ in range(5))
+)
+update_kpss_lagged_products(
+    arange(1, dtype=float64), arange(2, dtype=float64).reshape(2, 1),
+    arange(1, dtype=float64), 0, 0, arange(1, dtype=float64).reshape(1, 1)
+)
+update_kpss_batch(
+    arange(1, dtype=float64).reshape(1, 1), arange(2, dtype=float64).reshape(2, 1),
+    arange(1, dtype=float64), 0, 0, *(arange(1, dtype=float64) for _ in range(5)),
+    arange(1, dtype=float64).reshape(1, 1)
+)
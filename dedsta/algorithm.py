@@ -1,10 +1,20 @@
 __author__ = "Tomasz Rybotycki"
 
 
-from KDEpy import FFTKDE
-from numpy.typing import ArrayLike
-from dedsta.structure import DEDSTAReservoir, DEDSTAModule
-from typing import List
+from collections import OrderedDict
+from math import floor
+from numpy import (
+    array_equal, asarray, bincount, complex128, finfo, float32, float64, intp,
+    linspace
+)
+from scipy.fft import irfft, next_fast_len, rfft
+from numpy.typing import ArrayLike, NDArray
+from dedsta.structure import DEDSTAAgingModule, DEDSTAReservoir, DEDSTAModule
+from dedsta._kernels import aged_linear_binning
+from typing import List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from KDEpy import FFTKDE
 
 
 class DEDSTA:
@@ -27,7 +37,29 @@ class DEDSTA:
         self.kernel: str = kernel
         self.modules: List[DEDSTAModule] = list()
 
-    def update(self, data_point: ArrayLike[float]) -> None:
+        self._kde: Optional["FFTKDE"] = None
+        # Kernel for which the FFTKDE instance was created.
+        self._kde_kernel: Optional[str] = None
+        # Maps (kernel, number of grid points, grid spacing) to the number of grid
+        # offsets within the kernel support, the length of the FFT and the Fourier
+        # transform of the sampled kernel.
+        self._grid_cache: OrderedDict[
+            Tuple[str, int, float], Tuple[int, int, NDArray[complex128]]
+        ] = OrderedDict()
+
+        # The grid, the reservoir version, the modules and the kernel of the last
+        # evaluation, and its result.
+        self._cached_grid: Optional[NDArray[float64]] = None
+        self._cached_version: int = -1
+        self._cached_modules: Tuple[DEDSTAModule, ...] = tuple()
+        self._cached_kernel: Optional[str] = None
+        self._cached_values: Optional[NDArray[float64]] = None
+
+    # Maximal number of grids for which the kernel transforms are cached. The
+    # estimator is usually evaluated on the same grid over and over again.
+    _GRID_CACHE_SIZE: int = 8
+
+    def update(self, data_point: ArrayLike) -> None:
         """
         Updates the estimator with a new data point.
 
@@ -36,7 +68,17 @@ class DEDSTA:
         """
         self.reservoir.add(data_point)
 
-    def evaluate(self, grid_points: ArrayLike[float]) -> ArrayLike[float]:
+    def update_batch(self, data_points: ArrayLike) -> None:
+        """
+        Updates the estimator with a batch of new data points. It's equivalent to,
+        but faster than, updating the estimator with each of them in turn.
+
+        :param data_points:
+            New data points, in the order of their arrival.
+        """
+        self.reservoir.add_batch(data_points)
+
+    def evaluate(self, grid_points: ArrayLike) -> NDArray[float64]:
         """
         Evaluates the estimator at given grid points.
 
@@ -49,17 +91,194 @@ class DEDSTA:
         :return:
             Estimated density values at given grid points.
         """
-        self.reservoir.reset_weights()
+        grid_points = asarray(grid_points, dtype=float64)
 
-        nonstationarity_degree: float = 0
+        if (
+            self._cached_version == self.reservoir.version()
+            and self._cached_modules == tuple(self.modules)
+            and self._cached_kernel == self.kernel
+            and array_equal(self._cached_grid, grid_points)
+        ):
+            return self._cached_values.copy()
 
-        for module in self.modules:
-            module.apply(nonstationarity_degree)
+        nonstationarity_degree: float = 0.0
 
-        kde: FFTKDE = FFTKDE(bw=1, kernel=self.kernel).fit(
-            self.reservoir.get_points(),
-            self.reservoir.get_weights()
+        # For 1d streams, the KDE is computed directly, without the overhead of
+        # KDEpy's input processing and validation.
+        is_1d: bool = (
+            self.reservoir.dimension() == 1
+            and grid_points.size == grid_points.shape[0]
+        )
+        # If the last module is the aging module, the aging weights are computed
+        # while binning the data points, in a single pass over the reservoir.
+        # Resetting the weights beforehand is skipped, as all of them are
+        # overwritten anyway. Subclasses of the aging module may compute the weights
+        # differently, so they are applied as usual.
+        fuse_aging: bool = (
+            is_1d
+            and len(self.modules) > 0
+            and type(self.modules[-1]) is DEDSTAAgingModule
         )
 
-        return kde.evaluate(grid_points)
+        if fuse_aging:
+            for module in self.modules[:-1]:
+                module.apply(nonstationarity_degree)
+
+            self._cached_values = self._evaluate_1d(
+                self.reservoir.get_points().ravel(),
+                grid_points.ravel(),
+                self.reservoir.get_weights(),
+                nonstationarity=nonstationarity_degree
+            )
+        else:
+            self.reservoir.reset_weights()
+
+            for module in self.modules:
+                module.apply(nonstationarity_degree)
+
+            points: NDArray[float64] = self.reservoir.get_points()
+            weights: NDArray[float32] = self.reservoir.get_weights()
+
+            if is_1d:
+                self._cached_values = self._evaluate_1d(
+                    points.ravel(), grid_points.ravel(), weights
+                )
+            else:
+                self._cached_values = self._get_kde().fit(points, weights).evaluate(
+                    grid_points
+                )
+
+        self._cached_grid = grid_points.copy()
+        self._cached_modules = tuple(self.modules)
+        self._cached_kernel = self.kernel
+        # The modules may have changed the reservoir, so its version is read after
+        # applying them.
+        self._cached_version = self.reservoir.version()
+
+        return self._cached_values.copy()
+
+    def _evaluate_1d(
+        self,
+        points: NDArray[float64],
+        grid_points: NDArray[float64],
+        weights: NDArray[float32],
+        nonstationarity: Optional[float] = None
+    ) -> NDArray[float64]:
+        """
+        Evaluates the KDE of 1d data at given grid points. It follows the steps of
+        FFTKDE.evaluate, hence the results are the same.
+
+        :param points:
+            Data points, as an array of shape (n,).
+        :param grid_points:
+            Equidistant grid points, as an array of shape (m,).
+        :param weights:
+            Weights of the data points, as an array of shape (n,).
+        :param nonstationarity:
+            If given, the weights of the aging module for this nonstationarity
+            degree are computed during the binning and written to weights.
+
+        :return:
+            Estimated density values at given grid points.
+        """
+        n_grid_points: int = len(grid_points)
+        grid_start: float = grid_points[0]
+        grid_end: float = grid_points[-1]
+
+        if not (grid_start < points.min() and points.max() < grid_end):
+            raise ValueError("Every data point must be inside of the grid.")
+
+        dx: float = (grid_end - grid_start) / (n_grid_points - 1)
+
+        if nonstationarity is not None:
+            binned: NDArray[float64] = aged_linear_binning(
+                points, weights, float(nonstationarity), grid_start, dx, n_grid_points
+            )
+        else:
+            # Linear binning, with one extra bin for the data points which are
+            # rounded to the last grid point.
+            transformed_points: NDArray[float64] = (points - grid_start) / dx
+            indices: NDArray[intp] = transformed_points.astype(intp)
+            right_weights: NDArray[float64] = (transformed_points - indices) * weights
+            binned = (
+                bincount(
+                    indices, weights - right_weights, minlength=n_grid_points + 1
+                )
+                + bincount(indices + 1, right_weights, minlength=n_grid_points + 1)
+            )[:n_grid_points] / weights.sum(dtype=float64)
+
+        n_offsets, n, kernel_fft = self._get_kernel_fft(n_grid_points, dx)
+
+        # The linear convolution, computed as a circular one of sufficient length,
+        # cropped to the grid. The FFTs are multithreaded.
+        convolution: NDArray[float64] = irfft(
+            rfft(binned, n, workers=-1) * kernel_fft, n, workers=-1
+        )
+
+        return convolution[n_offsets:n_offsets + n_grid_points] + finfo(float).eps
+
+    def _get_kernel_fft(
+        self, n_grid_points: int, dx: float
+    ) -> Tuple[int, int, NDArray[complex128]]:
+        """
+        Returns the Fourier transform of the kernel sampled at the grid offsets
+        within its (practical) support, zero-padded to the length required for the
+        convolution. The length is rounded up to the nearest one for which the FFT
+        is fast, i.e. one with only small prime factors. The results are cached for
+        the last _GRID_CACHE_SIZE grids.
+
+        :param n_grid_points:
+            Number of grid points.
+        :param dx:
+            Distance between the neighbouring grid points.
+
+        :return:
+            The number of grid offsets within the kernel support (in one direction),
+            the length of the FFT and the Fourier transform of the sampled kernel.
+        """
+        key: Tuple[str, int, float] = (self.kernel, n_grid_points, float(dx))
+
+        if key in self._grid_cache:
+            self._grid_cache.move_to_end(key)
+            return self._grid_cache[key]
+
+        kde: "FFTKDE" = self._get_kde()
+        kernel = kde.kernel
+
+        if kernel.finite_support:
+            support: float = kernel.support
+        else:
+            support = kernel.practical_support(1)
+
+        n_offsets: int = min(floor(support / dx), n_grid_points)
+        offsets: NDArray[float64] = linspace(
+            -dx * n_offsets, dx * n_offsets, 2 * n_offsets + 1
+        )
+        kernel_weights: NDArray[float64] = kernel(
+            offsets.reshape(-1, 1), bw=1, norm=kde.norm
+        ).ravel()
+
+        n: int = next_fast_len(n_grid_points + 2 * n_offsets, real=True)
+        self._grid_cache[key] = (n_offsets, n, rfft(kernel_weights, n, workers=-1))
+
+        if len(self._grid_cache) > self._GRID_CACHE_SIZE:
+            self._grid_cache.popitem(last=False)
+
+        return self._grid_cache[key]
+
+    def _get_kde(self) -> "FFTKDE":
+        """
+        Returns the FFTKDE instance used by the estimator, creating it on the first
+        call and whenever the kernel was changed since. KDEpy is imported then, so
+        that the estimator can be constructed and updated without paying for the
+        import.
+
+        :return:
+            The FFTKDE instance.
+        """
+        if self._kde is None or self._kde_kernel != self.kernel:
+            from KDEpy import FFTKDE
+            self._kde = FFTKDE(bw=1, kernel=self.kernel)
+            self._kde_kernel = self.kernel
 
+        return self._kde
@@ -1,22 +1,72 @@
 from numpy.typing import NDArray, ArrayLike
 from abc import ABC, abstractmethod
-from numpy import array, delete, vstack
-from statsmodels.tsa.stattools import kpss
-from typing import List
-from math import exp
+from concurrent.futures import ThreadPoolExecutor
+from os import cpu_count
+from numpy import (
+    arange, asarray, ascontiguousarray, atleast_1d, concatenate, cumsum, empty,
+    float64, fromiter, intp, zeros
+)
+from typing import Any, Callable, Dict, List, Optional
+from dedsta._kernels import (
+    update_kpss_batch, update_kpss_lagged_products, update_kpss_partial_sums
+)
+from scipy.special import expit
 
 
-def sgm(x: float) -> float:
+# Coefficients of the formula mapping the KPSS statistic to the nonstationarity
+# degree, see KPSSNonstationarityDegreeEstimator.evaluate.
+_KPSS_A: float = 0.995
+_KPSS_B: float = 2.932
+
+# Keyword arguments of statsmodels' kpss, passed explicitly to skip its defaulting.
+_KPSS_KW: Dict[str, Any] = dict(regression="c", nlags="auto")
+
+# statsmodels' kpss, imported on first use. Importing statsmodels pulls in pandas
+# and patsy, which is costly and unnecessary if the KPSS test is never run.
+_kpss: Optional[Callable] = None
+
+
+def _get_kpss() -> Callable:
+    """
+    Returns statsmodels' kpss function, importing it on the first call.
+
+    :return:
+        The kpss function.
+    """
+    global _kpss
+
+    if _kpss is None:
+        from statsmodels.tsa.stattools import kpss
+        _kpss = kpss
+
+    return _kpss
+
+
+def sgm(x: ArrayLike) -> NDArray[float64]:
     """
-    Sigmoid function.
+    Sigmoid function. It's applied element-wise if an array is given.
 
     :param x:
-        Input value.
+        Input value(s).
 
     :return:
-        Value of the sigmoid function.
+        Value(s) of the sigmoid function.
     """
-    return 1 / (1 + exp(-x))
+    return expit(x)
+
+
+def _kpss_statistic(x: NDArray[float64]) -> float:
+    """
+    Computes the value of the KPSS test statistic for a 1d series.
+
+    :param x:
+        The series to test.
+
+    :return:
+        The KPSS test statistic.
+    """
+    kpss_value, _, _, _ = _get_kpss()(x, **_KPSS_KW)
+    return kpss_value
 
 
 class NonstationarityDegreeEstimator(ABC):
@@ -36,6 +86,17 @@ class NonstationarityDegreeEstimator(ABC):
         """
         raise NotImplementedError
 
+    def update_batch(self, data_points: NDArray[float]) -> None:
+        """
+        Updates the estimator with a batch of new data points. By default, it's
+        equivalent to updating the estimator with each of them in turn.
+
+        :param data_points:
+            New data points, in the order of their arrival.
+        """
+        for data_point in data_points:
+            self.update(data_point)
+
     @abstractmethod
     def evaluate(self) -> float:
         """
@@ -50,44 +111,316 @@ class NonstationarityDegreeEstimator(ABC):
 class KPSSNonstationarityDegreeEstimator(NonstationarityDegreeEstimator):
     """
     Nonstationarity degree estimator based on KPSS test.
+
+    If a fixed number of lags is given, the KPSS statistic is computed from partial
+    sums maintained incrementally in O(d) per update, instead of calling the KPSS
+    test from statsmodels on the whole window. Denoting the data points in the
+    window by :math:`x_1, ..., x_n` and their cumulative sums by
+    :math:`C_t = \\sum_{i \\leq t} x_i`, the numerator of the statistic is
+
+    .. math::
+        \\sum_t S_t^2 = \\sum_t C_t^2 - 2 \\bar{x} \\sum_t t C_t
+            + \\bar{x}^2 \\sum_t t^2,
+
+    where :math:`S_t = C_t - t \\bar{x}` are the partial sums of the residuals.
+    When the window slides, :math:`\\sum_t C_t`, :math:`\\sum_t C_t^2` and
+    :math:`\\sum_t t C_t` are updated in closed form. The long-run variance is
+    computed with the Newey-West estimator, exactly as statsmodels does. The
+    autocovariances it needs are obtained from the sums of the lagged products
+    :math:`\\sum_t x_t x_{t - i}`, which are updated in O(nlags d) per update, and
+    from the sums of the first and the last nlags data points in the window.
     """
 
-    def __init__(self, window_size: int = 600):
+    def __init__(self, window_size: int = 600, nlags: Optional[int] = None):
         """
         Constructor for the KPSSNonstationarityDegreeEstimator.
 
         :param window_size:
             Size of the window used for the estimation. It's set to 600 by default,
             as this value was empirically shown to work well.
+        :param nlags:
+            Number of lags used in the long-run variance estimation. If None, the
+            number of lags is selected automatically by statsmodels and the KPSS
+            test is recomputed on the whole window in every evaluation. Otherwise,
+            the statistic is computed incrementally.
         """
         super().__init__()
         self._window_size: int = window_size
-        self._data: ArrayLike[float] = array([])
+        # Ring buffer of shape (window_size, d) with the last window_size data
+        # points, so that each update writes exactly one row. The head is the index
+        # at which the next data point will be written. The buffer is allocated on
+        # the first update, when d is known.
+        self._data: NDArray[float64] = empty((0, 0), dtype=float64)
+        self._head: int = 0
+        self._filled: int = 0
+        # For streams with more than two dimensions the KPSS tests of the separate
+        # dimensions are run concurrently, as the underlying NumPy routines release
+        # the GIL. For fewer dimensions, or on a single CPU, the overhead of
+        # dispatching the tasks outweighs the gain. The threads of the pool are kept
+        # for the lifetime of the estimator, unless it's closed.
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+        self._nlags: Optional[int] = nlags
+        # Partial sums of the incremental KPSS statistic, one entry per dimension.
+        # They are computed for the data points shifted by _shift, which keeps
+        # their magnitudes (and hence the rounding errors) small.
+        self._shift: NDArray[float64] = empty(0, dtype=float64)
+        self._sum: NDArray[float64] = empty(0, dtype=float64)
+        self._squares_sum: NDArray[float64] = empty(0, dtype=float64)
+        self._cumulative_sum: NDArray[float64] = empty(0, dtype=float64)
+        self._cumulative_squares_sum: NDArray[float64] = empty(0, dtype=float64)
+        self._weighted_cumulative_sum: NDArray[float64] = empty(0, dtype=float64)
+        self._lagged_products: NDArray[float64] = empty((0, 0), dtype=float64)
+        # To prevent the accumulation of rounding errors, the sums are recomputed
+        # from the window every window_size updates, which keeps the amortized cost
+        # at O(d).
+        self._updates_since_recompute: int = 0
+
+        # The last evaluated value is cached, so that evaluating the estimator again
+        # without any update in between costs nothing.
+        self._version: int = 0
+        self._cached_version: int = -1
+        self._cached_value: float = 0.0
 
     def update(self, data_point: NDArray[float]) -> None:
         """
         Updates the estimator with a new data point.
 
         :param data_point:
-            New data point.
+            New data point. For 1d streams, it can also be a scalar.
         """
-        if len(self._data) == 0:
-            self._data = array([data_point])
+        data_point = atleast_1d(data_point)
+
+        if self._filled == 0:
+            self._allocate(data_point)
+
+        if self._nlags is not None:
+            self._update_partial_sums(data_point - self._shift)
+
+        self._data[self._head] = data_point
+        self._head = (self._head + 1) % self._window_size
+        self._filled = min(self._filled + 1, self._window_size)
+        self._version += 1
+
+        if self._nlags is not None:
+            self._updates_since_recompute += 1
+
+            if self._updates_since_recompute >= self._window_size:
+                self._recompute_partial_sums()
+
+    def update_batch(self, data_points: NDArray[float]) -> None:
+        """
+        Updates the estimator with a batch of new data points. It's equivalent to,
+        but faster than, updating the estimator with each of them in turn.
+
+        :param data_points:
+            New data points, in the order of their arrival, as an array of shape
+            (k, d) or (k,) for 1d streams.
+        """
+        data_points = asarray(data_points, dtype=float64)
+        k: int = len(data_points)
+
+        if k == 0:
             return
 
-        if len(self._data) == self._window_size:
-            print("Removing first element")
-            self._data = delete(self._data, 0, 0)
+        data_points = data_points.reshape(k, -1)
+
+        if self._filled == 0:
+            self._allocate(data_points[0])
 
-        self._data = vstack((self._data, data_point))
+        if k >= self._window_size:
+            self._data[:] = data_points[-self._window_size:]
+            self._head = 0
+        elif self._nlags is not None:
+            # The partial sums are updated with the data points one by one, while
+            # they are written into the buffer.
+            update_kpss_batch(
+                ascontiguousarray(data_points), self._data, self._shift, self._head,
+                self._filled, self._sum, self._squares_sum, self._cumulative_sum,
+                self._cumulative_squares_sum, self._weighted_cumulative_sum,
+                self._lagged_products
+            )
+            self._head = (self._head + k) % self._window_size
+        else:
+            indices: NDArray[intp] = (self._head + arange(k)) % self._window_size
+            self._data[indices] = data_points
+            self._head = (self._head + k) % self._window_size
+
+        self._filled = min(self._filled + k, self._window_size)
+        self._version += k
+
+        if self._nlags is not None:
+            # If the whole window was replaced, the counter reaches window_size
+            # and the sums are recomputed.
+            self._updates_since_recompute += k
+
+            if self._updates_since_recompute >= self._window_size:
+                self._recompute_partial_sums()
+
+    def close(self) -> None:
+        """
+        Shuts down the thread pool used for the KPSS tests of multidimensional
+        streams, if there is one. The estimator can still be used afterwards, but
+        the tests are run sequentially.
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _allocate(self, data_point: NDArray[float]) -> None:
+        """
+        Allocates the ring buffer and prepares the estimator for the stream of
+        data points of the same dimension as the given one.
+
+        :param data_point:
+            The first data point of the stream, as an array of shape (d,).
+        """
+        d: int = data_point.shape[-1]
+        self._data = empty((self._window_size, d), dtype=float64, order="C")
+
+        if self._nlags is not None:
+            self._shift = data_point.astype(float64)
+            self._reset_partial_sums()
+        elif d > 2 and self._pool is None and (cpu_count() or 1) > 1:
+            self._pool = ThreadPoolExecutor(max_workers=min(d, cpu_count()))
+
+    def _reset_partial_sums(self) -> None:
+        """
+        Sets all the partial sums of the incremental KPSS statistic to zero.
+        """
+        d: int = len(self._shift)
+        self._sum = zeros(d, dtype=float64)
+        self._squares_sum = zeros(d, dtype=float64)
+        self._cumulative_sum = zeros(d, dtype=float64)
+        self._cumulative_squares_sum = zeros(d, dtype=float64)
+        self._weighted_cumulative_sum = zeros(d, dtype=float64)
+        self._lagged_products = zeros(
+            (min(self._nlags, self._window_size - 1), d), dtype=float64
+        )
+
+    def _update_partial_sums(self, x: NDArray[float64]) -> None:
+        """
+        Updates the partial sums of the incremental KPSS statistic with a new
+        (shifted) data point. If the window is full, the oldest data point is
+        removed from the sums.
+
+        :param x:
+            New data point, shifted by _shift.
+        """
+        if self._filled < self._window_size:
+            oldest: NDArray[float64] = x
+        else:
+            oldest = self._data[self._head] - self._shift
+
+        update_kpss_partial_sums(
+            x, oldest, self._filled, self._window_size,
+            self._sum, self._squares_sum, self._cumulative_sum,
+            self._cumulative_squares_sum, self._weighted_cumulative_sum
+        )
+
+        if len(self._lagged_products) > 0:
+            update_kpss_lagged_products(
+                x, self._data, self._shift, self._head, self._filled,
+                self._lagged_products
+            )
+
+    def _recompute_partial_sums(self) -> None:
+        """
+        Recomputes the partial sums of the incremental KPSS statistic from the data
+        points in the window. The data points are shifted by their mean, so that
+        the magnitudes of the sums stay small even if the stream drifts.
+        """
+        data: NDArray[float64] = self._window()
+        self._shift = data.mean(axis=0)
+
+        x: NDArray[float64] = data - self._shift
+        c: NDArray[float64] = cumsum(x, axis=0)
+
+        self._sum = c[-1].copy()
+        self._squares_sum = (x * x).sum(axis=0)
+        self._cumulative_sum = c.sum(axis=0)
+        self._cumulative_squares_sum = (c * c).sum(axis=0)
+        self._weighted_cumulative_sum = arange(1, len(c) + 1, dtype=float64) @ c
+
+        for i in range(1, len(self._lagged_products) + 1):
+            self._lagged_products[i - 1] = (x[i:] * x[:len(x) - i]).sum(axis=0)
+
+        self._updates_since_recompute = 0
+
+    def _incremental_kpss_statistics(self) -> NDArray[float64]:
+        """
+        Computes the KPSS statistics of all the dimensions from the partial sums.
+        The result is equal to the one of statsmodels' kpss with regression="c"
+        and the given number of lags.
+
+        :return:
+            Array of shape (d,) with KPSS statistics of the separate dimensions.
+        """
+        n: int = self._filled
+        mean: NDArray[float64] = self._sum / n
+
+        residuals_partial_sums_squares: NDArray[float64] = (
+            self._cumulative_squares_sum
+            - 2 * mean * self._weighted_cumulative_sum
+            + mean * mean * (n * (n + 1) * (2 * n + 1) / 6)
+        )
+        eta: NDArray[float64] = residuals_partial_sums_squares / (n * n)
+
+        long_run_variance: NDArray[float64] = self._squares_sum - n * mean * mean
+        nlags: int = min(self._nlags, n - 1)
+
+        if nlags > 0:
+            # Sums of the first and of the last i data points in the window, for
+            # i = 1, ..., nlags.
+            oldest_index: int = self._head if n == self._window_size else 0
+            first_sums: NDArray[float64] = cumsum(
+                self._data[(oldest_index + arange(nlags)) % self._window_size]
+                - self._shift,
+                axis=0
+            )
+            last_sums: NDArray[float64] = cumsum(
+                self._data[(self._head - 1 - arange(nlags)) % self._window_size]
+                - self._shift,
+                axis=0
+            )
+
+            # The sums of e_t e_{t - i} over the window, where e_t = x_t - mean.
+            lags: NDArray[float64] = arange(1, nlags + 1, dtype=float64)[:, None]
+            autocovariances: NDArray[float64] = (
+                self._lagged_products[:nlags]
+                - mean * (2 * self._sum - first_sums - last_sums)
+                + (n - lags) * mean * mean
+            )
+
+            long_run_variance += (
+                2 * (1 - lags / (nlags + 1)) * autocovariances
+            ).sum(axis=0)
+
+        return eta / (long_run_variance / n)
+
+    def _window(self) -> NDArray[float64]:
+        """
+        Returns the data points in the window in the order of their arrival.
+
+        :return:
+            Array of shape (n, d) with the data points from the window, where n is
+            the number of data points seen so far, capped at the window size.
+        """
+        if self._filled < self._window_size:
+            return self._data[:self._filled]
+
+        if self._head == 0:
+            return self._data
+
+        return concatenate((self._data[self._head:], self._data[:self._head]))
 
     def evaluate(self) -> float:
         """
         Estimates the value of the nonstationarity degree. The formula for 1d
-        nonstationarity degree :math:`\nu` is as follows:
+        nonstationarity degree :math:`\\nu` is as follows:
 
         .. math::
-            \nu = sgm(0.995 \cdot KPSS - 2.932),
+            \\nu = sgm(0.995 \\cdot KPSS - 2.932),
 
         where :math:`KPSS` is the value of the KPSS test, and :math:`sgm` is the
         sigmoid function. The values of the coefficients in the formula were selected
@@ -102,10 +435,29 @@ class KPSSNonstationarityDegreeEstimator(NonstationarityDegreeEstimator):
         :return:
             Estimated nonstationarity degree in the range [0, 1].
         """
-        dimension_nonstationarity_degrees: List[float] = []
+        if self._version == self._cached_version:
+            return self._cached_value
+
+        if self._nlags is not None:
+            kpss_values: NDArray[float64] = self._incremental_kpss_statistics()
+        else:
+            # The columns of the window are strided, so the window is transposed
+            # once, making every dimension a C-contiguous row that kpss doesn't
+            # need to copy.
+            data: NDArray[float64] = ascontiguousarray(self._window().T)
+            columns: List[NDArray[float64]] = list(data)
+
+            # Import statsmodels here, before the tests are dispatched to threads.
+            _get_kpss()
+
+            if self._pool is None:
+                statistics = map(_kpss_statistic, columns)
+            else:
+                statistics = self._pool.map(_kpss_statistic, columns)
+
+            kpss_values = fromiter(statistics, dtype=float64, count=len(columns))
 
-        for i in range(self._data.shape[1]):
-            kpss_value, _, _, _ = kpss(self._data[:, i])
-            dimension_nonstationarity_degrees.append(sgm(0.995 * kpss_value - 2.932))
+        self._cached_value = float(sgm(_KPSS_A * kpss_values - _KPSS_B).max())
+        self._cached_version = self._version
 
-        return max(dimension_nonstationarity_degrees)
+        return self._cached_value
@@ -1,25 +1,13 @@
 __author__ = "Tomasz Rybotycki"
 
-from typing import List
 import abc
 from math import floor
-from numpy.typing import ArrayLike
-
-
-class DEDSTADataPoint:
-    """
-    Class representing a single data point in DEDSTA algorithm. The value can either
-    be a single number or a vector.
-    """
-    def __init__(self, value: ArrayLike):
-        """
-        Initializes the data point.
-
-        :param value:
-            New data point sampled from the stream.
-        """
-        self.value: ArrayLike = value
-        self.weight: float = 1.0
+from numpy import (
+    arange, asarray, ascontiguousarray, atleast_1d, concatenate, empty, float32,
+    float64, intp, ones
+)
+from numpy.typing import ArrayLike, NDArray
+from dedsta._kernels import aging_weights
 
 
 class DEDSTAReservoir(abc.ABC):
@@ -38,19 +26,50 @@ class DEDSTAReservoir(abc.ABC):
         self.min_size: int = min_size
         self.max_size: int = max_size
 
-        self.data_points: List[DEDSTADataPoint] = list()
+        # The data points are kept in a structure-of-arrays layout: values in a
+        # C-contiguous array of shape (max_size, d), allocated with the first data
+        # point, and weights in a separate array. The weights are only used as
+        # relative factors in the KDE, so single precision is sufficient for them,
+        # and it halves the memory traffic of their updates.
+        self._values: NDArray[float64] = empty((0, 0), dtype=float64)
+        self._weights: NDArray[float32] = ones(max_size, dtype=float32)
+        self._size: int = 0
+        # Increased with every change of the stored data points, so that the
+        # results computed from them can be cached.
+        self._version: int = 0
 
+    @abc.abstractmethod
     def add(self, data_point: ArrayLike) -> None:
         """
-        Adds a new data point to the reservoir.
+        Adds a new data point to the reservoir. If the reservoir is full, a data
+        point is removed first. The choice of the data point depends on the
+        implementation.
 
         :param data_point:
             New data point sampled from the stream.
         """
-        if self.size() >= self.max_size:
-            self.remove()
+        raise NotImplementedError
+
+    def add_batch(self, data_points: ArrayLike) -> None:
+        """
+        Adds a batch of new data points to the reservoir. By default, it's
+        equivalent to adding each of them in turn.
+
+        :param data_points:
+            New data points sampled from the stream, in the order of their arrival.
+        """
+        for data_point in data_points:
+            self.add(data_point)
 
-        self.data_points.insert(0, DEDSTADataPoint(data_point))
+    def _allocate(self, d: int) -> None:
+        """
+        Allocates the buffer for the values. It's done once the first data point
+        comes, as only then the dimension of the stream is known.
+
+        :param d:
+            Dimension of the data points.
+        """
+        self._values = empty((self.max_size, d), dtype=float64, order="C")
 
     @abc.abstractmethod
     def remove(self) -> None:
@@ -60,30 +79,44 @@ class DEDSTAReservoir(abc.ABC):
         """
         raise NotImplementedError
 
-    def get_points(self) -> List[ArrayLike]:
+    def truncate_to(self, new_size: int) -> None:
         """
-        Returns all points from the reservoir.
+        Removes data points from the reservoir until its size doesn't exceed the
+        given one. By default, it calls remove for every excess data point.
+
+        :param new_size:
+            Desired maximal size of the reservoir.
+        """
+        while self.size() > new_size:
+            self.remove()
+
+    @abc.abstractmethod
+    def get_points(self) -> NDArray[float64]:
+        """
+        Returns all points from the reservoir, starting from the newest one.
 
         :return:
-            All points from the reservoir.
+            All points from the reservoir as a C-contiguous array of shape
+            (size, d).
         """
-        return [point.value for point in self.data_points]
+        raise NotImplementedError
 
-    def get_weights(self) -> List[float]:
+    def get_weights(self) -> NDArray[float32]:
         """
-        Returns all weights from the reservoir.
+        Returns all weights from the reservoir, in the same order as the points,
+        i.e. the weight of the i-th newest data point is at index i.
 
         :return:
-            All weights from the reservoir.
+            All weights from the reservoir as an array of shape (size,). It's a
+            view on the reservoir's buffer.
         """
-        return [point.weight for point in self.data_points]
+        return self._weights[:self._size]
 
     def reset_weights(self) -> None:
         """
         Resets all weights in the reservoir.
         """
-        for point in self.data_points:
-            point.weight = 1.0
+        self._weights[:self._size] = 1.0
 
     def size(self) -> int:
         """
@@ -92,7 +125,26 @@ class DEDSTAReservoir(abc.ABC):
         :return:
             Size of the reservoir.
         """
-        return len(self.data_points)
+        return self._size
+
+    def version(self) -> int:
+        """
+        Returns the version of the reservoir, which changes whenever its content
+        changes.
+
+        :return:
+            Version of the reservoir.
+        """
+        return self._version
+
+    def dimension(self) -> int:
+        """
+        Returns the dimension of the data points in the reservoir.
+
+        :return:
+            Dimension of the data points, or 0 if no data point was added yet.
+        """
+        return self._values.shape[1]
 
 
 class DEDSTASlidingWindowReservoir(DEDSTAReservoir):
@@ -110,12 +162,110 @@ class DEDSTASlidingWindowReservoir(DEDSTAReservoir):
             Maximum size of the reservoir.
         """
         super().__init__(min_size, max_size)
+        # The values array is used as a ring buffer. The head index points to the
+        # newest data point and moves backwards with every insertion, so that the
+        # data points (from the newest to the oldest) occupy indices head,
+        # head + 1, ..., head + size - 1 (modulo max_size). Thanks to that, neither
+        # adding nor removing data points requires moving the stored values.
+        self._head: int = 0
+
+    def add(self, data_point: ArrayLike) -> None:
+        """
+        Adds a new data point to the reservoir. If the reservoir is full, the
+        oldest data point is removed first.
+
+        :param data_point:
+            New data point sampled from the stream.
+        """
+        data_point = atleast_1d(data_point)
+
+        if self._values.shape[0] == 0:
+            self._allocate(data_point.shape[-1])
+
+        if self.size() >= self.max_size:
+            self.remove()
+
+        self._head = (self._head - 1) % self.max_size
+        self._values[self._head] = data_point
+        self._size += 1
+        self._version += 1
+
+    def add_batch(self, data_points: ArrayLike) -> None:
+        """
+        Adds a batch of new data points to the reservoir. They're written into the
+        ring buffer at once, overwriting the oldest data points if necessary.
+
+        :param data_points:
+            New data points sampled from the stream, in the order of their arrival,
+            as an array of shape (k, d) or (k,) for 1d streams.
+        """
+        data_points = asarray(data_points, dtype=float64)
+        k: int = len(data_points)
+
+        if k == 0:
+            return
+
+        data_points = data_points.reshape(k, -1)
+
+        if self._values.shape[0] == 0:
+            self._allocate(data_points.shape[1])
+
+        if k >= self.max_size:
+            # Only the newest max_size data points are kept, the newest one first.
+            self._values[:] = data_points[:-self.max_size - 1:-1]
+            self._head = 0
+        else:
+            indices: NDArray[intp] = (self._head - 1 - arange(k)) % self.max_size
+            self._values[indices] = data_points
+            self._head = (self._head - k) % self.max_size
+
+        self._size = min(self._size + k, self.max_size)
+        self._version += k
 
     def remove(self) -> None:
         """
-        Removes the last data point from the reservoir.
+        Removes the last (the oldest) data point from the reservoir. It's enough to
+        shrink the size, as the data point will be overwritten by further
+        insertions.
+        """
+        self._size -= 1
+        self._version += 1
+
+    def truncate_to(self, new_size: int) -> None:
+        """
+        Removes the oldest data points from the reservoir until its size doesn't
+        exceed the given one. It's done at once by shrinking the size.
+
+        :param new_size:
+            Desired maximal size of the reservoir.
+        """
+        if self._size > new_size:
+            self._size = new_size
+            self._version += 1
+
+    def get_points(self) -> NDArray[float64]:
         """
-        self.data_points.pop(-1)
+        Returns all points from the reservoir, starting from the newest one.
+
+        :return:
+            All points from the reservoir as a C-contiguous array of shape
+            (size, d). Unless the stored points wrap around the end of the buffer,
+            it's a view on the reservoir's buffer, hence it shouldn't be modified.
+        """
+        end: int = self._head + self._size
+
+        if end <= self.max_size:
+            points: NDArray[float64] = self._values[self._head:end]
+        else:
+            points = concatenate(
+                (self._values[self._head:], self._values[:end - self.max_size])
+            )
+
+        # KDEpy and the numba kernels would otherwise silently copy or reject
+        # strided arrays. For a row slice it's a no-op.
+        points = ascontiguousarray(points)
+
+        return points
 
 
 class DEDSTAModule(abc.ABC):
@@ -141,11 +291,20 @@ class DEDSTAAgingModule(DEDSTAModule):
     Class representing a module responsible for updating weights in DEDSTA algorithm.
     """
     def __init__(self, reservoir: DEDSTAReservoir) -> None:
+        """
+        Initializes the module.
+
+        :param reservoir:
+            Reservoir to which the module should be applied.
+        """
         super().__init__(reservoir)
 
     def apply(self, nonstationarity: float) -> None:
         """
-        Updates weights of all data points in the reservoir.
+        Updates weights of all data points in the reservoir. The weight of the i-th
+        newest data point is set to :math:`2 (1 - i \\nu / n)`, where :math:`n` is
+        the number of data points in the reservoir and :math:`\\nu` is the
+        nonstationarity degree.
 
         :note:
             It assumes that the new element is inserted at the beginning of the
@@ -154,12 +313,10 @@ class DEDSTAAgingModule(DEDSTAModule):
         :param nonstationarity:
             Nonstationarity degree.
         """
-        n_elements: int = self.reservoir.size()
+        if self.reservoir.size() == 0:
+            return
 
-        for i in range(n_elements):
-            self.reservoir.data_points[i].weight = (
-                2 * (1 - i * nonstationarity / n_elements)
-            )
+        aging_weights(self.reservoir.get_weights(), float(nonstationarity))
 
 
 class DEDSTAReductionModule(DEDSTAModule):
@@ -184,12 +341,12 @@ class DEDSTAReductionModule(DEDSTAModule):
 
         We first compute the intermediate value :math:`m*` as follows:
         .. math::
-            m* = \text{floor}(1.1 m_0 (1 - \nu)),
+            m* = \\text{floor}(1.1 m_0 (1 - \\nu)),
 
-        where :math:`m_0` is the maximal size of the reservoir, and :math:`\nu` is the
-        nonstationarity degree. The desired size of the elements in the current step
-        is equal to :math:`m*` or :math:`m_0` (:math:`m_min`) if :math:`m*' is greater
-        (smaller) than :math:`m_0` (:math:`m_min`).
+        where :math:`m_0` is the maximal size of the reservoir, and :math:`\\nu` is
+        the nonstationarity degree. The desired size of the elements in the current
+        step is equal to :math:`m*` or :math:`m_0` (:math:`m_min`) if :math:`m*' is
+        greater (smaller) than :math:`m_0` (:math:`m_min`).
 
         :param nonstationarity:
             Nonstationarity degree.
@@ -201,5 +358,4 @@ class DEDSTAReductionModule(DEDSTAModule):
         if m > self.reservoir.max_size:
             m = self.reservoir.max_size
 
-        while self.reservoir.size() > m:
-            self.reservoir.remove()
+        self.reservoir.truncate_to(m)
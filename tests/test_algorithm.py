@@ -0,0 +1,174 @@
+__author__ = "Tomasz Rybotycki"
+
+from KDEpy import FFTKDE
+from numpy import allclose, arange, float32, float64, linspace
+from numpy.random import default_rng
+from numpy.typing import NDArray
+from typing import List
+
+from dedsta import (
+    DEDSTA, DEDSTAAgingModule, DEDSTAModule, DEDSTAReductionModule,
+    DEDSTASlidingWindowReservoir
+)
+
+
+def _aging_weights(n: int, nonstationarity: float) -> NDArray[float64]:
+    return 2 - 2 * nonstationarity * arange(n) / n
+
+
+def test_1d_evaluation_matches_fftkde() -> None:
+    grids: List[NDArray[float64]] = [
+        linspace(-10, 10, 256), linspace(-6, 7, 1001), linspace(-30, 30, 50)
+    ]
+
+    for kernel in ("gaussian", "epa", "triweight", "box"):
+        for grid in grids:
+            reservoir: DEDSTASlidingWindowReservoir = DEDSTASlidingWindowReservoir(
+                20, 100
+            )
+            estimator: DEDSTA = DEDSTA(reservoir, kernel)
+            estimator.update_batch(default_rng(4).standard_normal(150))
+            reservoir.reset_weights()
+            points: NDArray[float64] = reservoir.get_points().ravel()
+            weights: NDArray[float64] = default_rng(5).uniform(size=len(points))
+
+            values: NDArray[float64] = estimator._evaluate_1d(
+                points, grid, weights.astype(float32)
+            )
+            expected: NDArray[float64] = FFTKDE(bw=1, kernel=kernel).fit(
+                points, weights.astype(float32)
+            ).evaluate(grid)
+
+            assert allclose(values, expected, rtol=0, atol=1e-12)
+
+
+def test_kernel_change_is_applied() -> None:
+    reservoir: DEDSTASlidingWindowReservoir = DEDSTASlidingWindowReservoir(20, 100)
+    estimator: DEDSTA = DEDSTA(reservoir)
+    estimator.update_batch(default_rng(6).standard_normal(100))
+    grid: NDArray[float64] = linspace(-8, 8, 101)
+    points: NDArray[float64] = reservoir.get_points().ravel()
+    estimator.evaluate(grid)
+
+    estimator.kernel = "box"
+
+    assert allclose(
+        estimator.evaluate(grid),
+        FFTKDE(bw=1, kernel="box").fit(points).evaluate(grid),
+        rtol=0,
+        atol=1e-12
+    )
+
+
+def test_fused_aging_matches_fftkde() -> None:
+    reservoir: DEDSTASlidingWindowReservoir = DEDSTASlidingWindowReservoir(20, 300)
+    estimator: DEDSTA = DEDSTA(reservoir)
+    estimator.modules = [
+        DEDSTAReductionModule(reservoir), DEDSTAAgingModule(reservoir)
+    ]
+    estimator.update_batch(default_rng(0).standard_normal(500))
+    grid: NDArray[float64] = linspace(-8, 8, 301)
+    points: NDArray[float64] = reservoir.get_points().ravel()
+
+    for nonstationarity in (0.0, 0.4, 0.9):
+        weights: NDArray[float64] = _aging_weights(len(points), nonstationarity)
+        values: NDArray[float64] = estimator._evaluate_1d(
+            points, grid, reservoir.get_weights(), nonstationarity=nonstationarity
+        )
+        expected: NDArray[float64] = FFTKDE(bw=1).fit(points, weights).evaluate(
+            grid
+        )
+
+        assert allclose(values, expected, rtol=0, atol=1e-12)
+        assert allclose(reservoir.get_weights(), weights, rtol=1e-6)
+
+
+def test_fused_aging_writes_weights() -> None:
+    reservoir: DEDSTASlidingWindowReservoir = DEDSTASlidingWindowReservoir(20, 100)
+    estimator: DEDSTA = DEDSTA(reservoir)
+    estimator.modules = [DEDSTAAgingModule(reservoir)]
+    estimator.update_batch(default_rng(1).standard_normal(150))
+    reservoir.reset_weights()
+
+    estimator.evaluate(linspace(-8, 8, 101))
+
+    assert allclose(reservoir.get_weights(), _aging_weights(100, 0.0))
+
+
+def test_aging_module_subclass_is_applied() -> None:
+    class HalvingModule(DEDSTAAgingModule):
+        def apply(self, nonstationarity: float) -> None:
+            self.reservoir.get_weights()[len(self.reservoir.get_weights()) // 2:] = 0
+
+    reservoir: DEDSTASlidingWindowReservoir = DEDSTASlidingWindowReservoir(20, 100)
+    estimator: DEDSTA = DEDSTA(reservoir)
+    estimator.modules = [HalvingModule(reservoir)]
+    estimator.update_batch(default_rng(2).standard_normal(100))
+    grid: NDArray[float64] = linspace(-8, 8, 101)
+    points: NDArray[float64] = reservoir.get_points().ravel()
+
+    assert allclose(
+        estimator.evaluate(grid),
+        FFTKDE(bw=1).fit(points[:50]).evaluate(grid),
+        rtol=0,
+        atol=1e-12
+    )
+
+
+def test_evaluation_cache_tracks_modules() -> None:
+    reservoir: DEDSTASlidingWindowReservoir = DEDSTASlidingWindowReservoir(20, 100)
+    estimator: DEDSTA = DEDSTA(reservoir)
+    estimator.update_batch(default_rng(3).standard_normal(100))
+    grid: NDArray[float64] = linspace(-8, 8, 101)
+    values: NDArray[float64] = estimator.evaluate(grid)
+
+    assert allclose(estimator.evaluate(grid), values)
+
+    class HalvingModule(DEDSTAModule):
+        def apply(self, nonstationarity: float) -> None:
+            self.reservoir.get_weights()[len(self.reservoir.get_weights()) // 2:] = 0
+
+    estimator.modules.append(HalvingModule(reservoir))
+
+    assert not allclose(estimator.evaluate(grid), values)
+
+
+def test_reduction_module_truncates_the_reservoir() -> None:
+    reservoir: DEDSTASlidingWindowReservoir = DEDSTASlidingWindowReservoir(20, 100)
+    estimator: DEDSTA = DEDSTA(reservoir)
+    reduction_module: DEDSTAReductionModule = DEDSTAReductionModule(reservoir)
+    estimator.modules = [reduction_module]
+    data: NDArray[float64] = default_rng(7).standard_normal(130)
+    estimator.update_batch(data[:60])
+    estimator.update_batch(data[60:])
+    grid: NDArray[float64] = linspace(-8, 8, 101)
+
+    # The estimator is evaluated with no nonstationarity, so no data point is
+    # dropped.
+    version: int = reservoir.version()
+    estimator.evaluate(grid)
+
+    assert reservoir.size() == 100
+    assert reservoir.version() == version
+
+    reduction_module.apply(0.5)
+
+    assert reservoir.size() == 55
+    assert allclose(reservoir.get_points().ravel(), data[:-56:-1], rtol=0, atol=0)
+    assert reservoir.version() > version
+
+    version = reservoir.version()
+    reduction_module.apply(0.5)
+
+    assert reservoir.size() == 55
+    assert reservoir.version() == version
+
+    reduction_module.apply(1)
+
+    assert reservoir.size() == 20
+    assert allclose(
+        estimator.evaluate(grid),
+        FFTKDE(bw=1).fit(data[:-21:-1]).evaluate(grid),
+        rtol=0,
+        atol=1e-12
+    )
@@ -0,0 +1,176 @@
+__author__ = "Tomasz Rybotycki"
+
+import pytest
+
+from numpy import (
+    allclose, array, concatenate, cumsum, empty, exp, float64, isclose
+)
+from numpy.random import default_rng
+from numpy.typing import NDArray
+from statsmodels.tsa.stattools import kpss
+
+from dedsta import KPSSNonstationarityDegreeEstimator
+from dedsta import nonstationarity
+
+# Statsmodels warns whenever the statistic is outside of its p-values table.
+pytestmark = pytest.mark.filterwarnings("ignore")
+
+
+def _kpss_statistics(window: NDArray[float64], nlags: int) -> NDArray[float64]:
+    return array([
+        kpss(column, regression="c", nlags=min(nlags, len(window) - 1))[0]
+        for column in window.T
+    ])
+
+
+def _nonstationarity_degree(window: NDArray[float64]) -> float:
+    statistics: NDArray[float64] = array(
+        [kpss(column, regression="c", nlags="auto")[0] for column in window.T]
+    )
+    return float(max(1 / (1 + exp(-(0.995 * statistics - 2.932)))))
+
+
+@pytest.mark.parametrize("d", [1, 3])
+def test_evaluate_matches_statsmodels(
+    d: int, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    window_size: int = 20
+    estimator: KPSSNonstationarityDegreeEstimator = (
+        KPSSNonstationarityDegreeEstimator(window_size)
+    )
+    data: NDArray[float64] = cumsum(
+        default_rng(d).standard_normal((50, d)), axis=0
+    )
+
+    for t, data_point in enumerate(data):
+        # Scalars are passed for 1d streams.
+        estimator.update(data_point[0] if d == 1 else data_point)
+
+        if t in (9, 19, 32, 49):
+            window: NDArray[float64] = data[max(0, t + 1 - window_size):t + 1]
+            assert isclose(
+                estimator.evaluate(), _nonstationarity_degree(window), rtol=1e-12
+            )
+
+    def fail(_: NDArray[float64]) -> float:
+        raise AssertionError("The cached value should be returned.")
+
+    value: float = estimator.evaluate()
+    monkeypatch.setattr(nonstationarity, "_kpss_statistic", fail)
+
+    assert estimator.evaluate() == value
+
+
+@pytest.mark.parametrize("cpus", [1, 4])
+def test_thread_pool(cpus: int, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(nonstationarity, "cpu_count", lambda: cpus)
+    estimator: KPSSNonstationarityDegreeEstimator = (
+        KPSSNonstationarityDegreeEstimator(20)
+    )
+    data: NDArray[float64] = cumsum(default_rng(0).standard_normal((30, 3)), axis=0)
+    estimator.update_batch(data[:25])
+
+    assert (estimator._pool is not None) == (cpus > 1)
+    assert isclose(
+        estimator.evaluate(), _nonstationarity_degree(data[5:25]), rtol=1e-12
+    )
+
+    estimator.close()
+    estimator.update_batch(data[25:])
+
+    assert estimator._pool is None
+    assert isclose(
+        estimator.evaluate(), _nonstationarity_degree(data[10:]), rtol=1e-12
+    )
+
+
+@pytest.mark.parametrize("nlags", [0, 2, 9, 15])
+def test_incremental_statistics_match_statsmodels(nlags: int) -> None:
+    window_size: int = 10
+    estimator: KPSSNonstationarityDegreeEstimator = (
+        KPSSNonstationarityDegreeEstimator(window_size, nlags)
+    )
+    # A random walk far from zero, over several window wraps and recomputations of
+    # the partial sums.
+    data: NDArray[float64] = 1000 + cumsum(
+        default_rng(nlags).standard_normal((35, 3)), axis=0
+    )
+
+    for t, data_point in enumerate(data):
+        estimator.update(data_point)
+
+        if t < 2:
+            continue
+
+        window: NDArray[float64] = data[max(0, t + 1 - window_size):t + 1]
+
+        assert allclose(
+            estimator._incremental_kpss_statistics(),
+            _kpss_statistics(window, nlags),
+            rtol=1e-8,
+            atol=0
+        )
+
+
+@pytest.mark.parametrize("nlags", [0, 2, 6, 10])
+def test_incremental_statistics_with_batch_updates(nlags: int) -> None:
+    window_size: int = 7
+    estimator: KPSSNonstationarityDegreeEstimator = (
+        KPSSNonstationarityDegreeEstimator(window_size, nlags)
+    )
+    rng = default_rng(nlags)
+    # The data points in the window of the estimator.
+    window: NDArray[float64] = empty((0, 2))
+
+    for step in range(40):
+        batch: NDArray[float64] = step + cumsum(
+            rng.standard_normal((int(rng.integers(1, 12)), 2)), axis=0
+        )
+        window = concatenate((window, batch))[-window_size:]
+
+        if rng.random() < 0.5:
+            estimator.update_batch(batch)
+        else:
+            for data_point in batch:
+                estimator.update(data_point)
+
+        if len(window) < 3:
+            continue
+
+        assert allclose(
+            estimator._incremental_kpss_statistics(),
+            _kpss_statistics(window, nlags),
+            rtol=1e-8,
+            atol=0
+        )
+
+
+def test_batch_updates_give_the_same_partial_sums() -> None:
+    window_size: int = 10
+    single: KPSSNonstationarityDegreeEstimator = KPSSNonstationarityDegreeEstimator(
+        window_size, 3
+    )
+    batched: KPSSNonstationarityDegreeEstimator = (
+        KPSSNonstationarityDegreeEstimator(window_size, 3)
+    )
+    data: NDArray[float64] = 100 + cumsum(
+        default_rng(0).standard_normal((19, 2)), axis=0
+    )
+
+    for data_point in data:
+        single.update(data_point)
+
+    # The batches fill the window, which triggers the recomputation of the sums
+    # after the same number of updates as for the single updates, and then slide
+    # the window without another recomputation.
+    for batch in (data[:3], data[3:10], data[10:14], data[14:]):
+        batched.update_batch(batch)
+
+    for name in (
+        "_shift", "_sum", "_squares_sum", "_cumulative_sum",
+        "_cumulative_squares_sum", "_weighted_cumulative_sum", "_lagged_products"
+    ):
+        assert allclose(
+            getattr(batched, name), getattr(single, name), rtol=1e-10, atol=1e-10
+        )
+    assert allclose(batched._window(), single._window(), rtol=0, atol=0)
@@ -0,0 +1,81 @@
+__author__ = "Tomasz Rybotycki"
+
+from numpy import array, float64
+from numpy.random import default_rng
+from numpy.typing import NDArray
+from typing import List
+
+from dedsta import DEDSTASlidingWindowReservoir
+
+
+def _assert_points_equal(
+    reservoir: DEDSTASlidingWindowReservoir, expected: List[NDArray[float64]]
+) -> None:
+    points: NDArray[float64] = reservoir.get_points()
+
+    assert reservoir.size() == len(expected)
+    assert points.flags["C_CONTIGUOUS"]
+    assert (
+        points == array(expected).reshape(len(expected), reservoir.dimension())
+    ).all()
+
+
+def test_sliding_window_reservoir_matches_a_list() -> None:
+    max_size: int = 7
+    reservoir: DEDSTASlidingWindowReservoir = DEDSTASlidingWindowReservoir(
+        2, max_size
+    )
+    # The data points from the newest to the oldest one.
+    expected: List[NDArray[float64]] = []
+    rng = default_rng(0)
+
+    for step in range(60):
+        action: int = int(rng.integers(3))
+
+        if action == 0:
+            data_point: NDArray[float64] = rng.standard_normal(2)
+            reservoir.add(data_point)
+            expected = [data_point, *expected][:max_size]
+        elif action == 1:
+            batch: NDArray[float64] = rng.standard_normal(
+                (int(rng.integers(1, 2 * max_size)), 2)
+            )
+            reservoir.add_batch(batch)
+            expected = [*batch[::-1], *expected][:max_size]
+        else:
+            new_size: int = int(rng.integers(max_size + 1))
+            reservoir.truncate_to(new_size)
+            expected = expected[:new_size]
+
+        _assert_points_equal(reservoir, expected)
+
+
+def test_sliding_window_reservoir_wraps_around() -> None:
+    reservoir: DEDSTASlidingWindowReservoir = DEDSTASlidingWindowReservoir(2, 5)
+
+    for value in range(3):
+        reservoir.add(value)
+
+    # The head is at index 2 now, so the points wrap around the end of the buffer.
+    reservoir.add_batch([3.0, 4.0, 5.0])
+    _assert_points_equal(reservoir, [5.0, 4.0, 3.0, 2.0, 1.0])
+
+    reservoir.add(6.0)
+    _assert_points_equal(reservoir, [6.0, 5.0, 4.0, 3.0, 2.0])
+
+
+def test_sliding_window_reservoir_batch_after_truncation() -> None:
+    reservoir: DEDSTASlidingWindowReservoir = DEDSTASlidingWindowReservoir(2, 6)
+    reservoir.add_batch([0.0, 1.0, 2.0, 3.0])
+    _assert_points_equal(reservoir, [3.0, 2.0, 1.0, 0.0])
+
+    reservoir.truncate_to(2)
+    _assert_points_equal(reservoir, [3.0, 2.0])
+
+    # The batch fills the free slots and the ones of the removed data points.
+    reservoir.add_batch([4.0, 5.0, 6.0])
+    _assert_points_equal(reservoir, [6.0, 5.0, 4.0, 3.0, 2.0])
+
+    # The batch overwrites the oldest data points.
+    reservoir.add_batch([7.0, 8.0, 9.0])
+    _assert_points_equal(reservoir, [9.0, 8.0, 7.0, 6.0, 5.0, 4.0])